@@ -3,7 +3,24 @@ from aspyrobotmx import RobotClientMX
 from . import RobotDHS
 import json
 import logging.config
-from time import sleep
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib parser
+    orjson = None
+
+
+def load_config(path):
+    """Load a JSON config file.
+
+    Configs are parsed with orjson when the `orjson` extra is installed; it is
+    stricter than the json module and rejects NaN, Infinity and integers wider
+    than 64 bits.
+
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    return orjson.loads(data) if orjson else json.loads(data)
 
 
 @click.command()
@@ -11,11 +28,8 @@ from time import sleep
 @click.option('--config', type=click.Path(exists=True))
 def run(dcss, config):
     if config:
-        with open(config) as file:
-            config = json.load(file)
+        config = load_config(config)
         if 'logging' in config:
             logging.config.dictConfig(config['logging'])
     dhs = RobotDHS(dcss=dcss, robot=RobotClientMX())
-    dhs.setup()
-    while True:
-        sleep(.01)
+    dhs.loop()
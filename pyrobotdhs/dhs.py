@@ -1,5 +1,8 @@
-from functools import partial
-from threading import Thread
+from functools import lru_cache, partial
+from string import ascii_uppercase
+from threading import Condition, Lock, Thread
+from time import sleep
+import warnings
 from enum import IntEnum
 
 from aspyrobotmx.codes import (HolderType, PortState, RobotStatus, DumbbellState,
@@ -7,8 +10,31 @@ from aspyrobotmx.codes import (HolderType, PortState, RobotStatus, DumbbellState
 from dcss import Server as DHS
 
 
+POSITIONS = ('left', 'middle', 'right')
+
 SAMPLES_PER_POSITION = 96
 
+# DCSS port lists prefix each position's samples with its holder type
+SLOTS_PER_POSITION = SAMPLES_PER_POSITION + 1
+
+# Sample slots of each position in a DCSS port list, skipping the holder type
+PROBE_SLICES = {
+    position: slice(i * SLOTS_PER_POSITION + 1, (i + 1) * SLOTS_PER_POSITION)
+    for i, position in enumerate(POSITIONS)
+}
+
+# Seconds to wait for further EPICS updates before sending queued strings
+SEND_DELAY = 0.01
+
+# Methods which may be queued with RobotDHS.schedule_send, in flush order
+SCHEDULED_SENDS = (
+    'send_set_status_string',
+    'send_set_state_string',
+    'send_set_robot_cassette_string',
+    'send_set_output_string',
+    'send_set_input_string',
+)
+
 HOLDER_TYPE_MAP = {
     HolderType.unknown: 'u',
     HolderType.normal: '1',
@@ -24,6 +50,101 @@ PORT_STATE_MAP = {
     PortState.error: 'b',
 }
 
+# Ports per lettered column: cassettes are A1-L8 and superpuck adaptors A1-F16
+PORTS_PER_COLUMN = {
+    HolderType.normal: 8,
+    HolderType.calibration: 8,
+    HolderType.superpuck: 16,
+}
+
+# (column, row) label of each port index, per holder type
+PORT_LABELS = {
+    holder_type: tuple((ascii_uppercase[port // ports_per_column],
+                        port % ports_per_column + 1)
+                       for port in range(SAMPLES_PER_POSITION))
+    for holder_type, ports_per_column in PORTS_PER_COLUMN.items()
+}
+
+DUMBBELL_STATE_NAMES = {state.value: state.name for state in DumbbellState}
+
+LN2_LEVEL_MAP = {0: 'no', 1: 'yes'}
+
+# Sample locations and their DCSS sample state, in order of precedence
+SAMPLE_STATES = (
+    ('goniometer', 'on gonio'),
+    ('cavity', 'on tong'),
+    ('picker', 'on picker'),
+    ('placer', 'on placer'),
+)
+
+POSITION_MAP = {'l': 'left', 'm': 'middle', 'r': 'right'}
+
+LOG_LEVEL_MAP = {
+    'DEBUG': 'note',
+    'INFO': 'note',
+    'WARNING': 'warning',
+    'ERROR': 'error',
+}
+
+# robot_output: out0-15 with only the gripper, lid and heater outputs in use
+OUTPUT_STRING_TEMPLATE = (
+    'htos_set_string_completed robot_output normal '
+    '0 %s 0 %s 0 0 0 0 0 0 0 0 0 %s %s 0'
+)
+
+# robot_input: in0-15 with only the gripper, lid and heater inputs in use
+INPUT_STRING_TEMPLATE = (
+    'htos_set_string_completed robot_input normal '
+    '0 0 0 0 0 0 0 0 %s %s 0 %s %s %s 0 0'
+)
+
+STATUS_STRING_TEMPLATE = (
+    'htos_set_string_completed robot_status '
+    'normal '  # Always "normal"
+    'status: %s '
+    'need_reset: %d '
+    'need_cal: %d '
+    'state: {%s} '
+    'warning: {%s} '
+    'cal_msg: {%s} '
+    'cal_step: {%s} '  # TODO: should validate
+    'mounted: {%s} '
+    'pin_lost: %s '
+    'pin_mounted: %s '
+    'manual_mode: %d '
+    'need_mag_cal: %d '
+    'need_cas_cal: %d '
+    'need_clear: %d'
+)
+
+# Missing calibration timestamps are sent as empty braces
+TIMESTAMPS_STRING_TEMPLATE = (
+    'htos_set_string_completed ts_robot_cal normal '
+    '{%s} {%s} {%s} {%s} {%s}'  # toolset, left, middle, right, goniometer
+)
+
+FORCE_STRING_PREFIXES = {
+    position: 'htos_set_string_completed robot_force_%s normal' % position
+    for position in POSITIONS
+}
+
+STATE_STRING_TEMPLATE = (
+    'htos_set_string_completed robot_state normal '
+    '{%s} '  # sample_state
+    '{%s} '  # dumbbell_state
+    'P%s '  # closest_point
+    '%s '  # ln2
+    '{%s} '  # mounted
+    '0 0 0 '
+    '%d '  # sample_is_on_goni
+    '0 0 '
+    '{%s} '  # tong_port
+    '{%s} '  # picker_port
+    '{%s} '  # placer_port
+    '0 0 '
+    '0 0'
+)
+
 
 class Output(IntEnum):
     """Indexes of the digital outputs.
@@ -38,17 +159,62 @@ class Output(IntEnum):
     heater_air = 13
 
 
+# Prefix of the RobotDHS methods handling "robot_config <task>" operations
+ROBOT_CONFIG_PREFIX = 'robot_config_'
+
+# Robot client setter and command attribute for each toggleable output
+OUTPUT_SETTERS = {
+    Output.gripper: ('set_gripper', 'gripper_command'),
+    Output.lid: ('set_lid', 'lid_command'),
+    Output.heater: ('set_heater', 'heater_command'),
+    Output.heater_air: ('set_heater_air', 'heater_air_command'),
+}
+
+
+def _schedules(*methods):
+    """Build an EPICS callback which queues `methods` with `schedule_send`."""
+    def callback(self, value):
+        self.schedule_send(*methods)
+    return callback
+
+
+def _robot_config_dispatch(cls):
+    """Map robot_config task names to the `robot_config_*` method names of `cls`.
+
+    Names rather than functions are stored so `robot_config` resolves each
+    handler with getattr and sees methods patched after class creation.
+
+    """
+    return {name[len(ROBOT_CONFIG_PREFIX):]: name
+            for name in dir(cls) if name.startswith(ROBOT_CONFIG_PREFIX)}
+
+
 class RobotDHS(DHS):
 
+    def __init_subclass__(cls, **kwargs):
+        super(RobotDHS, cls).__init_subclass__(**kwargs)
+        cls._ROBOT_CONFIG_DISPATCH = _robot_config_dispatch(cls)
+
     def __init__(self, dcss, robot):
         super(RobotDHS, self).__init__('robot', dcss)
         self.robot = robot
         self.robot.delegate = self
+        self.send_delay = SEND_DELAY
+        self._pending_sends = set()
+        self._pending_sends_changed = Condition()
+        self._sender_thread = None
+        self._last_sent = {}
+        self._last_sent_lock = Lock()
 
     def setup(self):
-        """Start DHS.loop to process incoming DCSS messages
+        """Start DHS.loop in a background thread to process DCSS messages
+
+        Deprecated: call `loop()` directly instead, as `pyrobotdhs.cmd.run`
+        does. The thread is available as `recv_loop_thread`.
 
         """
+        warnings.warn('RobotDHS.setup() is deprecated, call loop() instead',
+                      DeprecationWarning, stacklevel=2)
         self.recv_loop_thread = Thread(target=self.loop, daemon=True)
         self.recv_loop_thread.start()
 
@@ -57,13 +223,14 @@ class RobotDHS(DHS):
 
         """
         super(RobotDHS, self).login()
+        with self._last_sent_lock:
+            self._last_sent.clear()  # The new DCSS connection needs everything
         self.robot.setup()
         self.send_set_status_string()
         self.send_set_state_string()
         self.send_set_robot_cassette_string()
-        self.send_set_robot_force_string('left')
-        self.send_set_robot_force_string('middle')
-        self.send_set_robot_force_string('right')
+        for position in POSITIONS:
+            self.send_set_robot_force_string(position)
         self.send_calibration_timestamps()
 
     def operation_callback(self, operation, handle, stage, message=None,
@@ -82,6 +249,72 @@ class RobotDHS(DHS):
             else:
                 operation.operation_completed(message or 'OK')
 
+    def send_if_changed(self, key, msg):
+        """Send `msg` to the DCSS unless it matches the last message for `key`.
+
+        The cache is cleared on login so a new DCSS connection receives every
+        string again. The socket write happens outside the lock so a blocked
+        connection cannot stall `login`.
+
+        """
+        with self._last_sent_lock:
+            if self._last_sent.get(key) == msg:
+                return
+            self._last_sent[key] = msg
+        try:
+            self.send_xos3(msg)
+        except Exception:
+            with self._last_sent_lock:
+                if self._last_sent.get(key) == msg:
+                    del self._last_sent[key]  # Retry on the next send
+            raise
+
+    def schedule_send(self, *methods):
+        """Queue `send_set_*` methods to be called after `send_delay` seconds.
+
+        EPICS updates tend to arrive in bursts which each affect the same DCSS
+        strings. Queued methods are coalesced so each string is sent at most
+        once per flush, in the order given by `SCHEDULED_SENDS`.
+
+        Args:
+            methods: Names of the methods to call, eg `'send_set_status_string'`
+
+        """
+        unknown = set(methods).difference(SCHEDULED_SENDS)
+        if unknown:
+            raise ValueError('Cannot schedule %s' % ', '.join(sorted(unknown)))
+        with self._pending_sends_changed:
+            self._pending_sends.update(methods)
+            if self._sender_thread is None:
+                self._sender_thread = Thread(target=self._send_loop, daemon=True)
+                self._sender_thread.start()
+            self._pending_sends_changed.notify()
+
+    def flush_sends(self):
+        """Call any methods queued by `schedule_send`."""
+        with self._pending_sends_changed:
+            pending, self._pending_sends = self._pending_sends, set()
+        for method in SCHEDULED_SENDS:
+            if method in pending:
+                try:
+                    getattr(self, method)()
+                except Exception:
+                    self.log.exception('Error calling %s', method)
+
+    def _send_loop(self):
+        """Flush queued sends from a single background thread.
+
+        Waits for `schedule_send` to queue a method, then gives the rest of
+        the burst `send_delay` seconds to arrive before flushing.
+
+        """
+        while True:
+            with self._pending_sends_changed:
+                while not self._pending_sends:
+                    self._pending_sends_changed.wait()
+            sleep(self.send_delay)
+            self.flush_sends()
+
     # ***************************************************************
     # ******************** DHS attributes ***************************
     # ***************************************************************
@@ -114,7 +347,10 @@ class RobotDHS(DHS):
     @property
     def mounted(self):
         """The pin mounted in DCSS format: `'l 1 A'`."""
-        sample_on_goniometer = self.robot.sample_locations['goniometer']
+        return self._mounted(self.robot.sample_locations)
+
+    def _mounted(self, sample_locations):
+        sample_on_goniometer = sample_locations['goniometer']
         if not sample_on_goniometer:
             return ''
         return self.port_tuple_to_str(sample_on_goniometer)
@@ -122,20 +358,12 @@ class RobotDHS(DHS):
     @property
     def sample_state(self):
         """The sample location in DCSS format."""
-        location_to_state = {'cavity': 'on tong', 'picker': 'on picker',
-                             'placer': 'on placer', 'goniometer': 'on gonio'}
-        location = next((location_to_state[loc]
-                         for loc, sample in self.robot.sample_locations.items()
-                         if sample), 'no')
-        return location
+        return sample_state_from_locations(self.robot.sample_locations)
 
     @property
     def dumbbell_state(self):
         """The dumbbell location."""
-        try:
-            return DumbbellState(self.robot.dumbbell_state).name
-        except ValueError:
-            return 'bad'
+        return DUMBBELL_STATE_NAMES.get(self.robot.dumbbell_state, 'bad')
 
     @property
     def manual_mode(self):
@@ -154,12 +382,7 @@ class RobotDHS(DHS):
     @property
     def ln2(self):
         """Whether LN2 is present in DCSS format."""
-        if self.robot.ln2_level == 0:
-            return 'no'
-        elif self.robot.ln2_level == 1:
-            return 'yes'
-        else:
-            return 'wrong'
+        return LN2_LEVEL_MAP.get(self.robot.ln2_level, 'wrong')
 
     @property
     def state(self):
@@ -177,19 +400,13 @@ class RobotDHS(DHS):
         update the calibration message and also log to BluIce.
 
         """
-        self.send_set_status_string()
-        try:
-            level, message = value.split(' ', 1)
-        except ValueError:
+        self.schedule_send('send_set_status_string')
+        level, space, message = value.partition(' ')
+        if not space:
             self.log.error('Expected space in %r', value)
             level, message = 'INFO', value
-        level = {
-            'DEBUG': 'note',
-            'INFO': 'note',
-            'WARNING': 'warning',
-            'ERROR': 'error',
-        }.get(level, 'error')
-        self.send_xos3('htos_log %s robot %s' % (level, message))
+        self.send_xos3('htos_log %s robot %s'
+                       % (LOG_LEVEL_MAP.get(level, 'error'), message))
 
     def on_system_error_message(self, value):
         if value != 'OK':
@@ -197,54 +414,33 @@ class RobotDHS(DHS):
 
     def on_port_distances(self, value):
         # TODO: Need to know which position
-        self.send_set_robot_force_string('left')
-        self.send_set_robot_force_string('middle')
-        self.send_set_robot_force_string('right')
-
-    def on_status(self, _): self.send_set_status_string()
-
-    def on_current_task(self, _): self.send_set_status_string()
-
-    def on_at_home(self, _): self.send_set_status_string()
-
-    def on_lid_command(self, _): self.send_set_output_string()
-
-    def on_gripper_command(self, _): self.send_set_output_string()
-
-    def on_heater_command(self, _): self.send_set_output_string()
-
-    def on_heater_air_command(self, _): self.send_set_output_string()
-
-    def on_lid_open(self, _): self.send_set_input_string()
-
-    def on_lid_closed(self, _): self.send_set_input_string()
-
-    def on_gripper_open(self, _): self.send_set_input_string()
-
-    def on_gripper_closed(self, _): self.send_set_input_string()
-
-    def on_heater_hot(self, _): self.send_set_input_string()
-
-    def on_pins_mounted(self, _): self.send_set_status_string()
-
-    def on_pins_lost(self, _): self.send_set_status_string()
-
-    def on_task_progress(self, _): self.send_set_status_string()
-
-    def on_closest_point(self, _): self.send_set_state_string()
-
-    def on_ln2_level(self, _): self.send_set_state_string()
-
-    def on_dumbbell_state(self, _): self.send_set_state_string()
-
-    def on_port_states(self, _): self.send_set_robot_cassette_string()
-
-    def on_holder_types(self, _): self.send_set_robot_cassette_string()
-
-    def on_sample_locations(self, _):
-        self.send_set_state_string()
-        self.send_set_status_string()
-        self.send_set_robot_cassette_string()
+        for position in POSITIONS:
+            self.send_set_robot_force_string(position)
+
+    # Callbacks which only need to queue DCSS string updates
+    on_status = _schedules('send_set_status_string')
+    on_current_task = _schedules('send_set_status_string')
+    on_at_home = _schedules('send_set_status_string')
+    on_pins_mounted = _schedules('send_set_status_string')
+    on_pins_lost = _schedules('send_set_status_string')
+    on_task_progress = _schedules('send_set_status_string')
+    on_lid_command = _schedules('send_set_output_string')
+    on_gripper_command = _schedules('send_set_output_string')
+    on_heater_command = _schedules('send_set_output_string')
+    on_heater_air_command = _schedules('send_set_output_string')
+    on_lid_open = _schedules('send_set_input_string')
+    on_lid_closed = _schedules('send_set_input_string')
+    on_gripper_open = _schedules('send_set_input_string')
+    on_gripper_closed = _schedules('send_set_input_string')
+    on_heater_hot = _schedules('send_set_input_string')
+    on_closest_point = _schedules('send_set_state_string')
+    on_ln2_level = _schedules('send_set_state_string')
+    on_dumbbell_state = _schedules('send_set_state_string')
+    on_port_states = _schedules('send_set_robot_cassette_string')
+    on_holder_types = _schedules('send_set_robot_cassette_string')
+    on_sample_locations = _schedules('send_set_state_string',
+                                     'send_set_status_string',
+                                     'send_set_robot_cassette_string')
 
     def on_last_toolset_calibration(self, _): self.send_calibration_timestamps()
 
@@ -265,33 +461,21 @@ class RobotDHS(DHS):
 
     def send_set_output_string(self):
         """Send DCSS the state of digital outputs."""
-        msg = (
-            'htos_set_string_completed robot_output normal '
-            '0 '  # out0
-            '{robot.gripper_command} '
-            '0 '  # out2
-            '{robot.lid_command} '
-            '0 0 0 0 0 0 0 0 0 '  # out4-14
-            '{robot.heater_air_command} '
-            '{robot.heater_command} '
-            '0'  # out15
-        ).format(robot=self.robot)
-        self.send_xos3(msg)
+        robot = self.robot
+        msg = OUTPUT_STRING_TEMPLATE % (
+            robot.gripper_command, robot.lid_command,
+            robot.heater_air_command, robot.heater_command,
+        )
+        self.send_if_changed('robot_output', msg)
 
     def send_set_input_string(self):
         """Send DCSS the state of digital inputs."""
-        msg = (
-            'htos_set_string_completed robot_input normal '
-            '0 0 0 0 0 0 0 0 '  # in0-7
-            '{robot.gripper_open} '
-            '{robot.gripper_closed} '
-            '0 '  # in10
-            '{robot.lid_closed} '
-            '{robot.lid_open} '
-            '{robot.heater_hot} '
-            '0 0'  # in14-15
-        ).format(robot=self.robot)
-        self.send_xos3(msg)
+        robot = self.robot
+        msg = INPUT_STRING_TEMPLATE % (
+            robot.gripper_open, robot.gripper_closed,
+            robot.lid_closed, robot.lid_open, robot.heater_hot,
+        )
+        self.send_if_changed('robot_input', msg)
 
     def send_set_status_string(self):
         """Send the robot_status string to the DCSS.
@@ -310,23 +494,26 @@ class RobotDHS(DHS):
             * pin_mounted: Number of pins mounted since last reset.
 
         """
-        msg = ('htos_set_string_completed robot_status '
-               'normal '  # Always "normal"
-               'status: {0.robot.status} '
-               'need_reset: {0.needs_reset:d} '
-               'need_cal: {0.needs_calibration:d} '
-               'state: {{{0.state}}} '
-               'warning: {{{0.warning}}} '
-               'cal_msg: {{{robot.task_message}}} '
-               'cal_step: {{{robot.task_progress}}} '  # TODO: should validate
-               'mounted: {{{0.mounted}}} '
-               'pin_lost: {0.robot.pins_lost} '
-               'pin_mounted: {0.robot.pins_mounted} '
-               'manual_mode: {0.manual_mode:d} '
-               'need_mag_cal: {0.needs_toolset_calibration:d} '
-               'need_cas_cal: {0.needs_cassette_calibration:d} '
-               'need_clear: {0.needs_clear:d}').format(self, robot=self.robot)
-        self.send_xos3(msg)
+        robot = self.robot
+        # Read the status PV once rather than once per needs_* property
+        status = robot.status
+        msg = STATUS_STRING_TEMPLATE % (
+            status,
+            bool(status & RobotStatus.need_reset),
+            bool(status & RobotStatus.need_cal_all),
+            self.state,
+            self.warning,
+            robot.task_message,
+            robot.task_progress,
+            self.mounted,
+            robot.pins_lost,
+            robot.pins_mounted,
+            self.manual_mode,
+            bool(status & RobotStatus.need_cal_magnet),
+            bool(status & RobotStatus.need_cal_cassette),
+            bool(status & RobotStatus.need_clear),
+        )
+        self.send_if_changed('robot_status', msg)
 
     def send_set_state_string(self):
         """Send the robot_state string to the DCSS.
@@ -356,78 +543,57 @@ class RobotDHS(DHS):
             * num_pin_moved num_puck_pin_moved
 
         """
-        sample_is_on_goni = bool(self.robot.sample_locations['goniometer'])
-        tong_port = self.port_tuple_to_str(self.robot.sample_locations['cavity'])
-        picker_port = self.port_tuple_to_str(self.robot.sample_locations['picker'])
-        placer_port = self.port_tuple_to_str(self.robot.sample_locations['placer'])
-        msg = (
-            'htos_set_string_completed robot_state normal '
-            '{{{0.sample_state}}} '
-            '{{{0.dumbbell_state}}} '
-            'P{robot.closest_point} '
-            '{0.ln2} '
-            '{{{0.mounted}}} '
-            '0 0 0 '
-            '{sample_is_on_goni:d} '
-            '0 0 '
-            '{{{tong_port}}} '
-            '{{{picker_port}}} '
-            '{{{placer_port}}} '
-            '0 0 '
-            '0 0'
-        ).format(self, robot=self.robot, sample_is_on_goni=sample_is_on_goni,
-                 tong_port=tong_port, picker_port=picker_port,
-                 placer_port=placer_port)
-        self.send_xos3(msg)
+        robot = self.robot
+        locations = robot.sample_locations
+        msg = STATE_STRING_TEMPLATE % (
+            sample_state_from_locations(locations),
+            self.dumbbell_state,
+            robot.closest_point,
+            self.ln2,
+            self._mounted(locations),
+            bool(locations['goniometer']),
+            self.port_tuple_to_str(locations['cavity']),
+            self.port_tuple_to_str(locations['picker']),
+            self.port_tuple_to_str(locations['placer']),
+        )
+        self.send_if_changed('robot_state', msg)
 
     def send_set_robot_cassette_string(self):
         """Send DCSS the probe states."""
         # TODO: Test mounted position
-        sample_on_goni = self.robot.sample_locations['goniometer']
+        robot = self.robot
+        sample_on_goni = robot.sample_locations['goniometer']
         mounted_position, mounted_port = (sample_on_goni
                                           if sample_on_goni else (None, None))
-        msg = 'htos_set_string_completed robot_cassette normal'
-        for position in ['left', 'middle', 'right']:
-            states = [PORT_STATE_MAP[s] for s in self.robot.port_states[position]]
+        parts = ['htos_set_string_completed robot_cassette normal']
+        for position in POSITIONS:
+            states = [PORT_STATE_MAP.get(state, 'u')
+                      for state in robot.port_states[position]]
             if mounted_position == position:
                 states[mounted_port] = 'm'
-            msg += ' {type} {states}'.format(
-                type=HOLDER_TYPE_MAP[self.robot.holder_types[position]],
-                states=' '.join(states)
-            )
-        self.send_xos3(msg)
+            parts.append(HOLDER_TYPE_MAP[robot.holder_types[position]])
+            parts.extend(states)
+        self.send_if_changed('robot_cassette', ' '.join(parts))
 
     def send_calibration_timestamps(self):
-        timestamps = [
-            self.robot.last_toolset_calibration,
-            self.robot.last_left_calibration,
-            self.robot.last_middle_calibration,
-            self.robot.last_right_calibration,
-            self.robot.last_goniometer_calibration,
-        ]
-        timestamp_strings = []
-        for ts in timestamps:
-            timestamp_strings.append('{%s}' % ts if ts else '{}')
-        msg = ('htos_set_string_completed ts_robot_cal normal ' +
-               ' '.join(timestamp_strings))
-        self.send_xos3(msg)
+        robot = self.robot
+        msg = TIMESTAMPS_STRING_TEMPLATE % (
+            robot.last_toolset_calibration or '',
+            robot.last_left_calibration or '',
+            robot.last_middle_calibration or '',
+            robot.last_right_calibration or '',
+            robot.last_goniometer_calibration or '',
+        )
+        self.send_if_changed('ts_robot_cal', msg)
 
     def send_set_robot_force_string(self, position):
-        distance_strings = []
-        for distance in self.robot.port_distances[position]:
-            if distance is None:
-                distance_strings.append('uuuu')
-            else:
-                distance_strings.append('{:.1f}'.format(distance))
-        msg = (
-            'htos_set_string_completed robot_force_{position} normal'
-            ' {height_error} {distances}'
-        ).format(
-            position=position,
-            height_error=self.robot.height_errors[position] or 0,
-            distances=' '.join(distance_strings)
-        )
-        self.send_xos3(msg)
+        robot = self.robot
+        distance_strings = ['uuuu' if distance is None else '%.1f' % distance
+                            for distance in robot.port_distances[position]]
+        msg = '%s %s %s' % (FORCE_STRING_PREFIXES[position],
+                            robot.height_errors[position] or 0,
+                            ' '.join(distance_strings))
+        self.send_if_changed('robot_force_' + position, msg)
 
     # ****************************************************************
     # ******************** dcss -> dhs messages **********************
@@ -455,9 +621,11 @@ class RobotDHS(DHS):
         Catch DCSS requests such as "robot_config <task>" and if there is a
         method named robot_config_<task> then execute that method.
         """
-        try:
-            func = getattr(self, 'robot_config_' + task)
-        except AttributeError:
+        name = self._ROBOT_CONFIG_DISPATCH.get(task)
+        if name is None:
+            name = ROBOT_CONFIG_PREFIX + task  # Handlers set on the instance
+        func = getattr(self, name, None)
+        if func is None:
             self.log.info('Operation robot_config %s is not handled' % task)
         else:
             func(operation, *args)
@@ -487,27 +655,18 @@ class RobotDHS(DHS):
 
     def robot_config_hw_output_switch(self, operation, output):
         """Called by the I/O buttons on the BluIce Robot Advanced tab."""
-        output = int(output)
-        if output == Output.gripper:
-            func = self.robot.set_gripper
-            value = 1 - self.robot.gripper_command
-        elif output == Output.lid:
-            func = self.robot.set_lid
-            value = 1 - self.robot.lid_command
-        elif output == Output.heater:
-            func = self.robot.set_heater
-            value = 1 - self.robot.heater_command
-        elif output == Output.heater_air:
-            func = self.robot.set_heater_air
-            value = 1 - self.robot.heater_air_command
-        else:
+        try:
+            setter, command = OUTPUT_SETTERS[int(output)]
+        except KeyError:
             return operation.operation_error('Not implemented')
+        func = getattr(self.robot, setter)
+        value = 1 - getattr(self.robot, command)
         func(value, callback=partial(self.operation_callback, operation))
 
     def robot_config_reset_cassette(self, operation):
         """Called by the "reset all to unknown" BluIce button."""
         callback = partial(self.operation_callback, operation)
-        self.robot.reset_holders(['left', 'middle', 'right'], callback=callback)
+        self.robot.reset_holders(list(POSITIONS), callback=callback)
 
     def robot_config_set_index_state(self, operation, start, port_count, state):
         """Called by right-clicking ports in BluIce.
@@ -520,11 +679,9 @@ class RobotDHS(DHS):
         """
         start, port_count = int(start), int(port_count)
         state = PortState.error if state == 'b' else PortState.unknown
-        samples_and_type_per_position = SAMPLES_PER_POSITION + 1
-        position_index = start // samples_and_type_per_position
-        position = ['left', 'middle', 'right'][position_index]
-        start = start % samples_and_type_per_position
-        start -= 1
+        position_index, slot = divmod(start, SLOTS_PER_POSITION)
+        position = POSITIONS[position_index]
+        start = slot - 1  # Slot 0 is the holder type
         # If right-clicking a single port we support setting it to error
         # If right-clicked on all for multiple ports only resetting to unknown
         # is supported
@@ -538,17 +695,18 @@ class RobotDHS(DHS):
                 self.robot.set_port_state(position, column, row, state,
                                           callback=callback)
         else:
-            end = start + port_count
-            ports = {position: [0] * SAMPLES_PER_POSITION
-                     for position in ['left', 'middle', 'right']}
-            ports[position][start:end] = [1] * port_count
+            # Clip the range to the position's samples so each list stays 96 long
+            end = min(start + port_count, SAMPLES_PER_POSITION)
+            start = max(start, 0)
+            ports = {p: [0] * SAMPLES_PER_POSITION for p in POSITIONS}
+            ports[position][start:end] = [1] * (end - start)
             callback = partial(self.operation_callback, operation)
             self.robot.reset_ports(ports, callback=callback)
 
     def robot_config_set_port_state(self, operation, port, state):
         """Called by the reset cassette status to unknown button in BluIce."""
         if port.endswith('X0') and state == 'u':
-            position = {'l': 'left', 'm': 'middle', 'r': 'right'}.get(port[0])
+            position = POSITION_MAP.get(port[0])
             callback = partial(self.operation_callback, operation)
             self.robot.reset_holders([position], callback=callback)
         else:
@@ -564,28 +722,24 @@ class RobotDHS(DHS):
         Called by running "robot_config set_mounted lA1" in BluIce Operation View.
 
         """
+        position = POSITION_MAP.get(arg[:1].lower())
+        column = arg[1:2].upper()
         try:
-            position, column, port = arg[0], arg[1], arg[2:]
-            position = {'l': 'left', 'm': 'middle', 'r': 'right'}[position.lower()]
-            column = column.upper()
-            port = int(port)
-            state = int(SampleState.goniometer)
-        except:
-            operation.operation_error('Invalid argument')
-        else:
-            callback = partial(self.operation_callback, operation)
-            self.robot.set_sample_state(position, column, port, state,
-                                        callback=callback)
+            port = int(arg[2:])
+        except ValueError:
+            port = None
+        if position is None or not column or port is None:
+            return operation.operation_error('Invalid argument')
+        state = int(SampleState.goniometer)
+        callback = partial(self.operation_callback, operation)
+        self.robot.set_sample_state(position, column, port, state,
+                                    callback=callback)
 
     def robot_config_probe(self, operation, *ports):
         """Called by starting a probe from the BluIce Robot Probe tab."""
-        ports = [int(p) for p in ports]
-        n = SAMPLES_PER_POSITION + 1
-        spec = {
-            'left': ports[1:n],  # Skip the holder type element
-            'middle': ports[n+1:2*n],
-            'right': ports[2*n+1:3*n],
-        }
+        ports = list(map(int, ports))
+        spec = {position: ports[ports_slice]
+                for position, ports_slice in PROBE_SLICES.items()}
         self.robot.probe(spec, callback=partial(self.operation_callback, operation))
 
     def robot_calibrate(self, operation, target, *task_args):
@@ -637,7 +791,7 @@ class RobotDHS(DHS):
 
         """
         self.log.info('mount_crystal: %r %r %r', cassette, row, column)
-        cassette = {'r': 'right', 'm': 'middle', 'l': 'left'}[cassette]
+        cassette = POSITION_MAP[cassette]
         callback = partial(self.operation_callback, operation)
         self.robot.mount(cassette, column, int(row), callback=callback)
 
@@ -648,7 +802,7 @@ class RobotDHS(DHS):
 
         """
         self.log.info('dismount_crystal: %r %r %r', cassette, row, column)
-        cassette = {'r': 'right', 'm': 'middle', 'l': 'left'}[cassette]
+        cassette = POSITION_MAP[cassette]
         callback = partial(self.operation_callback, operation)
         self.robot.dismount(cassette, column, int(row), callback=callback)
 
@@ -682,23 +836,45 @@ class RobotDHS(DHS):
         if not port_tuple:
             return 'invalid'
         position, port = port_tuple
-        try:
-            column, row = self.column_and_row_from_port_index(position, port)
-        except ValueError:
-            return 'invalid'
-        else:
-            return '{position} {row} {column}'.format(position=position[0],
-                                                      column=column, row=row)
+        return port_string(position, port, self.robot.holder_types[position])
 
     def column_and_row_from_port_index(self, position, port):
         holder_type = self.robot.holder_types[position]
-        if holder_type in {HolderType.normal, HolderType.calibration}:
-            column = chr(port // 8 + ord('A'))
-            row = port % 8 + 1
-            return column, row
-        elif holder_type == HolderType.superpuck:
-            puck = chr(port // 16 + ord('A'))
-            row = port % 16 + 1
-            return puck, row
-        else:
-            raise ValueError('Cannot determine column, port if type is unknown')
+        return column_and_row(holder_type, port)
+
+
+RobotDHS._ROBOT_CONFIG_DISPATCH = _robot_config_dispatch(RobotDHS)
+
+
+def sample_state_from_locations(sample_locations):
+    """The DCSS sample state for a robot `sample_locations` dict."""
+    for location, state in SAMPLE_STATES:
+        if sample_locations.get(location):
+            return state
+    return 'no'
+
+
+def column_and_row(holder_type, port):
+    """Convert a port index to a `(column, row)` tuple for the holder type.
+
+    Raises:
+        ValueError: If the holder type is unknown or the port is out of range.
+
+    """
+    labels = PORT_LABELS.get(holder_type)
+    if labels is None:
+        raise ValueError('Cannot determine column, port if type is unknown')
+    if not 0 <= port < SAMPLES_PER_POSITION:
+        raise ValueError('Invalid port %d' % port)
+    return labels[port]
+
+
+@lru_cache(maxsize=1024)  # Keys are raw robot values, so bound the cache
+def port_string(position, port, holder_type):
+    """Port string in DCSS format (eg `'l 1 A'`) or `'invalid'`."""
+    try:
+        column, row = column_and_row(holder_type, port)
+    except ValueError:
+        return 'invalid'
+    else:
+        return '%s %d %s' % (position[0], row, column)
@@ -18,6 +18,9 @@ setup(
         'click',
         'colorlog',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+    },
     entry_points={
         'console_scripts': [
             'pyrobotdhs=pyrobotdhs.cmd:run'
@@ -0,0 +1,29 @@
+import math
+import pytest
+
+from pyrobotdhs import cmd
+
+
+@pytest.fixture
+def config_path(tmpdir):
+    path = tmpdir.join('config.json')
+    path.write('{"a": 1}')
+    return str(path)
+
+
+def test_load_config(config_path):
+    assert cmd.load_config(config_path) == {'a': 1}
+
+
+def test_load_config_with_missing_file(tmpdir):
+    with pytest.raises(FileNotFoundError):
+        cmd.load_config(str(tmpdir.join('missing.json')))
+
+
+def test_load_config_falls_back_to_json(config_path, monkeypatch):
+    monkeypatch.setattr(cmd, 'orjson', None)
+    with open(config_path, 'w') as file:
+        file.write('{"a": NaN, "b": %d}' % 2 ** 64)
+    config = cmd.load_config(config_path)
+    assert math.isnan(config['a'])
+    assert config['b'] == 2 ** 64
@@ -1,15 +1,39 @@
 import pytest
-from unittest.mock import MagicMock, call, ANY
+from threading import Event, Thread
+from unittest.mock import MagicMock, call, patch, ANY
 
 from aspyrobotmx.codes import (HolderType, PortState, RobotStatus, DumbbellState,
                                SampleState, PortState)
 
 from pyrobotdhs import RobotDHS
+from pyrobotdhs.dhs import port_string
+
+NO_PORTS = [0] * 96
+ALL_PORTS = [1] * 96
+EXPECTED_CASSETTE_MSG = (
+    'htos_set_string_completed robot_cassette normal '
+    '{left} {middle} {right}'
+).format(
+    left=' '.join(['1'] + ['m'] + ['1'] * 95),
+    middle=' '.join(['3'] + ['0'] * 96),
+    right=' '.join(['u'] + ['u'] * 96),
+)
 
 
 @pytest.fixture
 def dhs():
-    return RobotDHS(dcss='0.0.0.0', robot=MagicMock())
+    port_string.cache_clear()  # MagicMock holder types would pile up
+    dhs = RobotDHS(dcss='0.0.0.0', robot=MagicMock())
+    dhs.send_xos3 = MagicMock()
+    return dhs
+
+
+def test_setup_is_deprecated_but_still_runs_loop(dhs):
+    dhs.loop = MagicMock()
+    with pytest.deprecated_call():
+        dhs.setup()
+    dhs.recv_loop_thread.join(timeout=1)
+    assert dhs.loop.called is True
 
 
 def test_robot_config(dhs):
@@ -18,88 +42,123 @@ def test_robot_config(dhs):
     assert dhs.robot_config_test.call_args == (('operation', 1, 2, 3),)
 
 
-@pytest.mark.parametrize('start,output', [(0, 1), (1, 0)])
-def test_robot_config_hw_output_switch_for_gripper(dhs, start, output):
-    mock_robot = dhs.robot
-    mock_operation = MagicMock()
-    mock_robot.gripper_command = start
-    mock_robot.set_gripper.return_value = None
-    dhs.robot_config_hw_output_switch(mock_operation, '1')
-    assert mock_robot.set_gripper.call_args == call(output, callback=ANY)
+def test_robot_config_dispatches_to_subclass_method():
+    robot_config_test = MagicMock()
 
+    class TestDHS(RobotDHS):
+        def robot_config_test(self, *args):
+            robot_config_test(*args)
 
-def test_robot_config_hw_output_switch_for_heater(dhs):
-    mock_robot = dhs.robot
-    mock_robot.heater_command = 1
-    dhs.robot_config_hw_output_switch(MagicMock(), '14')
-    assert mock_robot.set_heater.call_args == call(0, callback=ANY)
+    dhs = TestDHS(dcss='0.0.0.0', robot=MagicMock())
+    dhs.robot_config('operation', 'test', 1, 2, 3)
+    robot_config_test.assert_called_once_with('operation', 1, 2, 3)
 
 
-def test_robot_config_hw_output_switch_for_heater_air(dhs):
-    mock_robot = dhs.robot
-    mock_robot.heater_air_command = 1
-    dhs.robot_config_hw_output_switch(MagicMock(), '13')
-    assert mock_robot.set_heater_air.call_args == call(0, callback=ANY)
+def test_robot_config_dispatches_to_patched_method(dhs):
+    dhs.robot_config(MagicMock(), 'clear')
+    with patch.object(RobotDHS, 'robot_config_clear') as robot_config_clear:
+        dhs.robot_config('operation', 'clear')
+    robot_config_clear.assert_called_once_with('operation')
 
 
-def test_robot_config_reset_cassette(dhs):
-    dhs.robot_config_reset_cassette(MagicMock())
-    expected_call = call(['left', 'middle', 'right'], callback=ANY)
-    assert dhs.robot.reset_holders.call_args == expected_call
+def test_robot_config_ignores_unknown_task(dhs):
+    mock_operation = MagicMock()
+    dhs.robot_config(mock_operation, 'unknown_task')
+    assert mock_operation.mock_calls == []
+    assert dhs.robot.mock_calls == []
 
 
-def test_robot_config_set_index_state_cassette_port_17_unknown(dhs):
-    dhs.robot.configure_mock(holder_types={'left': HolderType.normal})
-    dhs.robot_config_set_index_state(MagicMock(), '17', '1', 'u')
-    expected_call = call('left', 'C', 1, PortState.unknown, callback=ANY)
-    assert dhs.robot.set_port_state.call_args == expected_call
+@pytest.mark.parametrize('command,setter,switch,start,output', [
+    ('gripper_command', 'set_gripper', '1', 0, 1),
+    ('gripper_command', 'set_gripper', '1', 1, 0),
+    ('heater_command', 'set_heater', '14', 1, 0),
+    ('heater_air_command', 'set_heater_air', '13', 1, 0),
+])
+def test_robot_config_hw_output_switch(dhs, command, setter, switch, start,
+                                       output):
+    setattr(dhs.robot, command, start)
+    dhs.robot_config_hw_output_switch(MagicMock(), switch)
+    getattr(dhs.robot, setter).assert_called_once_with(output, callback=ANY)
 
 
-def test_robot_config_set_index_state_adaptor_port_17_unknown(dhs):
-    dhs.robot.configure_mock(holder_types={'left': HolderType.superpuck})
-    dhs.robot_config_set_index_state(MagicMock(), '17', '1', 'u')
-    expected_call = call('left', 'B', 1, PortState.unknown, callback=ANY)
-    assert dhs.robot.set_port_state.call_args == expected_call
+def test_robot_config_hw_output_switch_for_unknown_output(dhs):
+    mock_operation = MagicMock()
+    dhs.robot_config_hw_output_switch(mock_operation, '2')
+    mock_operation.operation_error.assert_called_once_with('Not implemented')
+
+
+def test_robot_config_reset_cassette(dhs):
+    dhs.robot_config_reset_cassette(MagicMock())
+    dhs.robot.reset_holders.assert_called_once_with(
+        ['left', 'middle', 'right'], callback=ANY)
 
 
-def test_robot_config_set_index_state_adaptor_port_17_error(dhs):
-    dhs.robot.configure_mock(holder_types={'left': HolderType.superpuck})
-    dhs.robot_config_set_index_state(MagicMock(), '17', '1', 'b')
-    expected_call = call('left', 'B', 1, PortState.error, callback=ANY)
-    assert dhs.robot.set_port_state.call_args == expected_call
+@pytest.mark.parametrize('holder_type,state,column,port_state', [
+    (HolderType.normal, 'u', 'C', PortState.unknown),
+    (HolderType.superpuck, 'u', 'B', PortState.unknown),
+    (HolderType.superpuck, 'b', 'B', PortState.error),
+])
+def test_robot_config_set_index_state_port_17(dhs, holder_type, state, column,
+                                              port_state):
+    dhs.robot.configure_mock(holder_types={'left': holder_type})
+    dhs.robot_config_set_index_state(MagicMock(), '17', '1', state)
+    dhs.robot.set_port_state.assert_called_once_with(
+        'left', column, 1, port_state, callback=ANY)
 
 
 def test_robot_config_set_index_state_left_column_A(dhs):
     dhs.robot_config_set_index_state(MagicMock(), '1', '8', 'b')
     expected_ports = {'left': [1] * 8 + [0] * 88,
-                      'middle': [0] * 96,
-                      'right': [0] * 96}
-    assert dhs.robot.reset_ports.call_args == call(expected_ports, callback=ANY)
+                      'middle': NO_PORTS,
+                      'right': NO_PORTS}
+    dhs.robot.reset_ports.assert_called_once_with(expected_ports, callback=ANY)
 
 
 def test_robot_config_set_index_state_middle_adaptor_mB(dhs):
     dhs.robot_config_set_index_state(MagicMock(), '114', '16', 'b')
-    expected_ports = {'left': [0] * 96,
+    expected_ports = {'left': NO_PORTS,
                       'middle': [0] * 16 + [1] * 16 + [0] * 64,
-                      'right': [0] * 96}
-    assert dhs.robot.reset_ports.call_args == call(expected_ports, callback=ANY)
+                      'right': NO_PORTS}
+    dhs.robot.reset_ports.assert_called_once_with(expected_ports, callback=ANY)
+
+
+@pytest.mark.parametrize('start,port_count,expected_left', [
+    ('90', '16', [0] * 89 + [1] * 7),
+    ('0', '8', [1] * 7 + [0] * 89),
+])
+def test_robot_config_set_index_state_clips_range_to_position(
+        dhs, start, port_count, expected_left):
+    dhs.robot_config_set_index_state(MagicMock(), start, port_count, 'u')
+    ports = dhs.robot.reset_ports.call_args[0][0]
+    assert [len(ports[position]) for position in ports] == [96, 96, 96]
+    assert ports == {'left': expected_left,
+                     'middle': NO_PORTS,
+                     'right': NO_PORTS}
 
 
 def test_robot_config_set_port_state(dhs):
     dhs.robot_config_set_port_state(MagicMock(), 'lX0', 'u')
-    assert dhs.robot.reset_holders.call_args == call(['left'], callback=ANY)
+    dhs.robot.reset_holders.assert_called_once_with(['left'], callback=ANY)
 
 
 def test_system_error_message_updates_dcss(dhs):
-    dhs.send_xos3 = MagicMock()
     dhs.on_system_error_message('Bad bad happened')
-    assert dhs.send_xos3.call_args == call('htos_log error robot Bad bad happened')
+    dhs.send_xos3.assert_called_once_with('htos_log error robot Bad bad happened')
 
 
 def test_system_error_message_does_not_update_dcss_when_ok(dhs):
-    dhs.send_xos3 = MagicMock()
     dhs.on_system_error_message('OK')
-    assert dhs.send_xos3.call_args_list == []
+    dhs.send_xos3.assert_not_called()
+
+
+@pytest.mark.parametrize('value,expected_msg', [
+    ('WARNING lid open', 'htos_log warning robot lid open'),
+    ('DEBUG', 'htos_log note robot DEBUG'),
+])
+def test_task_message_logs_to_dcss(dhs, value, expected_msg):
+    dhs.schedule_send = MagicMock()
+    dhs.on_task_message(value)
+    dhs.send_xos3.assert_called_once_with(expected_msg)
 
 
 @pytest.mark.parametrize('callback', ['on_last_toolset_calibration',
@@ -113,32 +172,88 @@ def test_calibration_time_updates_send_timestamp_message(dhs, callback):
     assert dhs.send_calibration_timestamps.called is True
 
 
-def test_port_tuple_to_str_for_cassettes(dhs):
-    dhs.robot.configure_mock(
-        holder_types={'left': HolderType.normal}
-    )
-    s = dhs.port_tuple_to_str(('left', 16))
-    assert s == 'l 1 C'
+def test_callbacks_coalesce_string_sends(dhs):
+    dhs.send_delay = 60  # Flush manually rather than from the sender thread
+    dhs.send_set_status_string = MagicMock()
+    dhs.send_set_state_string = MagicMock()
+    dhs.send_set_robot_cassette_string = MagicMock()
+    dhs.send_set_output_string = MagicMock()
+    dhs.on_status(1)
+    dhs.on_pins_mounted(2)
+    dhs.on_sample_locations({})
+    dhs.on_port_states([])
+    dhs.on_lid_command(1)
+    dhs.on_gripper_command(1)
+    assert dhs.send_set_status_string.called is False
+    dhs.flush_sends()
+    assert dhs.send_set_status_string.call_count == 1
+    assert dhs.send_set_state_string.call_count == 1
+    assert dhs.send_set_robot_cassette_string.call_count == 1
+    assert dhs.send_set_output_string.call_count == 1
+
+
+def test_flush_sends_in_fixed_order(dhs):
+    dhs.send_delay = 60
+    calls = MagicMock()
+    dhs.send_set_status_string = calls.status
+    dhs.send_set_state_string = calls.state
+    dhs.send_set_robot_cassette_string = calls.cassette
+    dhs.on_port_states([])
+    dhs.on_closest_point(1)
+    dhs.on_status(1)
+    dhs.flush_sends()
+    assert calls.mock_calls == [call.status(), call.state(), call.cassette()]
+
+
+def test_sender_thread_flushes_scheduled_sends(dhs):
+    sent = Event()
+    dhs.send_delay = 0
+    dhs.send_set_status_string = MagicMock(side_effect=lambda: sent.set())
+    dhs.on_status(1)
+    assert sent.wait(timeout=1)
+
+
+def test_schedule_send_rejects_unknown_method(dhs):
+    with pytest.raises(ValueError):
+        dhs.schedule_send('send_xos3')
+
+
+@pytest.mark.parametrize('holder_type,expected', [
+    (HolderType.normal, 'l 1 C'),
+    (HolderType.superpuck, 'l 1 B'),
+    (HolderType.unknown, 'invalid'),
+])
+def test_port_tuple_to_str(dhs, holder_type, expected):
+    dhs.robot.configure_mock(holder_types={'left': holder_type})
+    assert dhs.port_tuple_to_str(('left', 16)) == expected
 
 
-def test_port_tuple_to_str_for_adaptors(dhs):
-    dhs.robot.configure_mock(
-        holder_types={'left': HolderType.superpuck}
-    )
-    s = dhs.port_tuple_to_str(('left', 16))
-    assert s == 'l 1 B'
+@pytest.mark.parametrize('holder_type,port,expected', [
+    (HolderType.normal, 0, 'l 1 A'),
+    (HolderType.calibration, 95, 'l 8 L'),
+    (HolderType.superpuck, 95, 'l 16 F'),
+])
+def test_port_tuple_to_str_for_first_and_last_ports(dhs, holder_type, port,
+                                                    expected):
+    dhs.robot.configure_mock(holder_types={'left': holder_type})
+    assert dhs.port_tuple_to_str(('left', port)) == expected
 
 
-def test_port_tuple_to_str_for_unkown(dhs):
-    dhs.robot.configure_mock(
-        holder_types={'left': HolderType.unknown}
-    )
-    s = dhs.port_tuple_to_str(('left', 16))
-    assert s == 'invalid'
+@pytest.mark.parametrize('port', [-1, 96, 416])
+def test_port_tuple_to_str_for_out_of_range_port(dhs, port):
+    dhs.robot.configure_mock(holder_types={'left': HolderType.normal})
+    assert dhs.port_tuple_to_str(('left', port)) == 'invalid'
+
+
+def test_robot_config_set_index_state_for_holder_type_slot(dhs):
+    mock_operation = MagicMock()
+    dhs.robot.configure_mock(holder_types={'left': HolderType.normal})
+    dhs.robot_config_set_index_state(mock_operation, '0', '1', 'b')
+    mock_operation.operation_error.assert_called_once_with('Invalid port -1')
+    assert dhs.robot.set_port_state.called is False
 
 
 def test_send_set_state_string(dhs):
-    dhs.send_xos3 = MagicMock()
     # TODO: Test setting current_sample
     dhs.robot.configure_mock(
         dumbbell_state=1,
@@ -153,7 +268,7 @@ def test_send_set_state_string(dhs):
         }
     )
     dhs.send_set_state_string()
-    assert dhs.send_xos3.call_args == call(
+    dhs.send_xos3.assert_called_once_with(
         'htos_set_string_completed robot_state normal '
         '{on tong} {in_cradle} '
         'P18 '
@@ -169,7 +284,6 @@ def test_send_set_state_string(dhs):
 
 
 def test_send_set_state_string_with_sample_on_goni(dhs):
-    dhs.send_xos3 = MagicMock()
     dhs.robot.configure_mock(
         dumbbell_state=1,
         closest_point=18,
@@ -183,7 +297,7 @@ def test_send_set_state_string_with_sample_on_goni(dhs):
         }
     )
     dhs.send_set_state_string()
-    assert dhs.send_xos3.call_args == call(
+    dhs.send_xos3.assert_called_once_with(
         'htos_set_string_completed robot_state normal '
         '{on gonio} {in_cradle} '
         'P18 '
@@ -204,8 +318,8 @@ def test_robot_config_probe(dhs):
     mock_operation = MagicMock()
     ports = ['1'] * (96 + 1) + ['0'] * (96 + 1) * 2
     dhs.robot_config_probe(mock_operation, *ports)
-    expected_spec = {'left': [1] * 96, 'middle': [0] * 96, 'right': [0] * 96}
-    assert dhs.robot.probe.call_args == call(expected_spec, callback=ANY)
+    expected_spec = {'left': ALL_PORTS, 'middle': NO_PORTS, 'right': NO_PORTS}
+    dhs.robot.probe.assert_called_once_with(expected_spec, callback=ANY)
 
 
 def test_prepare_mount_crystal(dhs):
@@ -213,7 +327,7 @@ def test_prepare_mount_crystal(dhs):
     dhs.operation_complete = MagicMock()
     mock_operation = MagicMock()  # TODO: Make a fixture
     dhs.prepare_mount_crystal(mock_operation, 'r', '6', 'A', '0', '0', '0', '0')
-    assert mock_operation.operation_update.call_args == call('OK to prepare')
+    mock_operation.operation_update.assert_called_once_with('OK to prepare')
     assert dhs.robot.prepare_for_mount.called is True
 
 
@@ -225,11 +339,12 @@ def test_send_calibration_timestamps(dhs):
         last_right_calibration=None,
         last_goniometer_calibration=None,
     )
-    dhs.send_xos3 = MagicMock()
     dhs.send_calibration_timestamps()
     expected_msg = ('htos_set_string_completed ts_robot_cal normal '
                     '{2016/02/08 11:39:12} {} {} {} {}')
-    assert dhs.send_xos3.call_args == call(expected_msg)
+    dhs.send_xos3.assert_called_once_with(expected_msg)
+    dhs.send_calibration_timestamps()
+    assert dhs.send_xos3.call_count == 1
 
 
 def test_set_robot_cassette_string(dhs):
@@ -248,17 +363,35 @@ def test_set_robot_cassette_string(dhs):
             'right': HolderType.unknown,
         }
     )
-    dhs.send_xos3 = MagicMock()
+    dhs.send_set_robot_cassette_string()
+    dhs.send_xos3.assert_called_once_with(EXPECTED_CASSETTE_MSG)
+
+
+@pytest.mark.parametrize('code', [None, -1, 256, 99])
+def test_set_robot_cassette_string_with_unknown_port_state(dhs, code):
+    dhs.robot.configure_mock(
+        sample_locations={'goniometer': None},
+        port_states={
+            'left': [code] + [PortState.full] * 95,
+            'middle': [PortState.empty] * 96,
+            'right': [PortState.unknown] * 96,
+        },
+        holder_types={
+            'left': HolderType.normal,
+            'middle': HolderType.superpuck,
+            'right': HolderType.unknown,
+        }
+    )
     dhs.send_set_robot_cassette_string()
     expected_msg = (
         'htos_set_string_completed robot_cassette normal '
         '{left} {middle} {right}'
     ).format(
-        left=' '.join(['1'] + ['m'] + ['1'] * 95),
+        left=' '.join(['1'] + ['u'] + ['1'] * 95),
         middle=' '.join(['3'] + ['0'] * 96),
         right=' '.join(['u'] + ['u'] * 96),
     )
-    assert dhs.send_xos3.call_args == call(expected_msg)
+    dhs.send_xos3.assert_called_once_with(expected_msg)
 
 
 def test_send_set_output_string(dhs):
@@ -268,11 +401,22 @@ def test_send_set_output_string(dhs):
         heater_command=1,
         heater_air_command=1,
     )
-    dhs.send_xos3 = MagicMock()
     dhs.send_set_output_string()
     expected_msg = ('htos_set_string_completed robot_output normal '
                     '0 1 0 1 0 0 0 0 0 0 0 0 0 1 1 0')
-    assert dhs.send_xos3.call_args == call(expected_msg)
+    dhs.send_xos3.assert_called_once_with(expected_msg)
+
+
+def test_send_set_output_string_skips_unchanged_message(dhs):
+    dhs.robot.configure_mock(
+        gripper_command=1,
+        lid_command=1,
+        heater_command=1,
+        heater_air_command=1,
+    )
+    dhs.send_set_output_string()
+    dhs.send_set_output_string()
+    assert dhs.send_xos3.call_count == 1
 
 
 def test_send_set_input_string(dhs):
@@ -283,15 +427,24 @@ def test_send_set_input_string(dhs):
         lid_open=1,
         heater_hot=1,
     )
-    dhs.send_xos3 = MagicMock()
     dhs.send_set_input_string()
     expected_msg = ('htos_set_string_completed robot_input normal '
                     '0 0 0 0 0 0 0 0 1 1 0 1 1 1 0 0')
-    assert dhs.send_xos3.call_args == call(expected_msg)
+    dhs.send_xos3.assert_called_once_with(expected_msg)
+
+
+def test_send_set_robot_force_string(dhs):
+    dhs.robot.configure_mock(
+        port_distances={'left': [1.25, None, 0]},
+        height_errors={'left': None},
+    )
+    dhs.send_set_robot_force_string('left')
+    expected_msg = ('htos_set_string_completed robot_force_left normal '
+                    '0 1.2 uuuu 0.0')
+    dhs.send_xos3.assert_called_once_with(expected_msg)
 
 
 def test_send_set_status_string(dhs):
-    dhs.send_xos3 = MagicMock()
     status = (RobotStatus.need_clear | RobotStatus.reason_collision |
               RobotStatus.need_cal_cassette)
     dhs.robot.configure_mock(
@@ -321,7 +474,49 @@ def test_send_set_status_string(dhs):
                     'need_mag_cal: 0 '
                     'need_cas_cal: 1 '
                     'need_clear: 1')
-    assert dhs.send_xos3.call_args == call(expected_msg)
+    dhs.send_xos3.assert_called_once_with(expected_msg)
+
+
+def test_send_set_status_string_skips_unchanged_message(dhs):
+    dhs.robot.configure_mock(status=0, sample_locations={'goniometer': None})
+    dhs.send_set_status_string()
+    dhs.send_set_status_string()
+    assert dhs.send_xos3.call_count == 1
+    dhs.robot.configure_mock(pins_mounted=1)
+    dhs.send_set_status_string()
+    assert dhs.send_xos3.call_count == 2
+
+
+def test_send_if_changed_can_be_reentered_from_send(dhs):
+    def send_xos3(msg):
+        if msg == 'status':
+            dhs.send_if_changed('robot_state', 'state')
+    dhs.send_xos3.side_effect = send_xos3
+    sender = Thread(target=dhs.send_if_changed, args=('robot_status', 'status'),
+                    daemon=True)
+    sender.start()
+    sender.join(timeout=1)
+    assert not sender.is_alive()
+    assert dhs.send_xos3.call_args_list == [call('status'), call('state')]
+
+
+def test_send_if_changed_resends_after_failed_send(dhs):
+    dhs.send_xos3.side_effect = [OSError, None]
+    with pytest.raises(OSError):
+        dhs.send_if_changed('robot_status', 'msg')
+    dhs.send_if_changed('robot_status', 'msg')
+    assert dhs.send_xos3.call_count == 2
+
+
+def test_login_resends_unchanged_status_string(dhs):
+    dhs.robot.configure_mock(status=0, sample_locations={'goniometer': None})
+    dhs.send_set_status_string()
+    dhs.send_xos3.reset_mock()
+    for method in ['send_set_state_string', 'send_set_robot_cassette_string',
+                   'send_set_robot_force_string', 'send_calibration_timestamps']:
+        setattr(dhs, method, MagicMock())
+    dhs.login()
+    assert dhs.send_xos3.call_count == 1
 
 
 @pytest.mark.parametrize('sample_locations,value', [
@@ -354,15 +549,16 @@ def test_ln2_property(dhs, level, expected_str):
     assert dhs.ln2 == expected_str
 
 
-def test_robot_config_set_mounted(dhs):
-    mock_robot = dhs.robot
-    dhs.robot_config_set_mounted(MagicMock(), 'mJ2')
-    expected_call = call('middle', 'J', 2, SampleState.goniometer, callback=ANY)
-    assert mock_robot.set_sample_state.call_args == expected_call
+@pytest.mark.parametrize('arg,port', [('mJ2', 2), ('mJ12', 12)])
+def test_robot_config_set_mounted(dhs, arg, port):
+    dhs.robot_config_set_mounted(MagicMock(), arg)
+    dhs.robot.set_sample_state.assert_called_once_with(
+        'middle', 'J', port, SampleState.goniometer, callback=ANY)
 
 
-def test_robot_config_set_mounted_with_two_digit_port(dhs):
-    mock_robot = dhs.robot
-    dhs.robot_config_set_mounted(MagicMock(), 'mJ12')
-    expected_call = call('middle', 'J', 12, SampleState.goniometer, callback=ANY)
-    assert mock_robot.set_sample_state.call_args == expected_call
+@pytest.mark.parametrize('arg', ['', 'x', 'xJ2', 'mJ', 'mJa'])
+def test_robot_config_set_mounted_with_invalid_argument(dhs, arg):
+    mock_operation = MagicMock()
+    dhs.robot_config_set_mounted(mock_operation, arg)
+    mock_operation.operation_error.assert_called_once_with('Invalid argument')
+    assert dhs.robot.set_sample_state.called is False